@@ -1,8 +1,11 @@
 import discord
 from discord.ext import commands, tasks
-import json, os, io, re
+from dotenv import load_dotenv
+import asyncio, bisect, hashlib, hmac, json, os, io, re, time, zlib
 import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+from matplotlib.figure import Figure
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from typing import Optional, Union
 
 # ———————————— SETUP ————————————
@@ -11,6 +14,13 @@ TOKEN = os.getenv("DISCORD_TOKEN")
 GUILD_ID = int(os.getenv("GUILD_ID"))
 PREFIXES = ("!", "t?", "/")  # Multiple command prefixes
 STATUS_CHANNEL = "bot-commands"
+DEFAULT_TIMEZONE = os.getenv("TIMEZONE", "UTC")  # Used for guilds without !settimezone
+DAILY_REPORT_CRON = os.getenv("DAILY_REPORT_CRON", "0 9 * * *")  # Wall-clock time in guild timezone
+DAILY_REPORT_JITTER = int(os.getenv("DAILY_REPORT_JITTER", "900"))  # Max per-guild start offset (seconds)
+DAILY_REPORT_SPREAD = int(os.getenv("DAILY_REPORT_SPREAD", "300"))  # Window to spread DMs over (seconds)
+TRACE_FILE = os.getenv("TRACE_FILE")  # Record scrubbed command traces here for replay_trace.py
+# Keys the trace tokens; without it tokens only stay consistent within one run
+TRACE_SECRET = os.getenv("TRACE_SECRET", "").encode() or os.urandom(32)
 
 # ———————————— DISCORD BOT ————————————
 intents = discord.Intents.default()
@@ -23,6 +33,10 @@ bot = commands.Bot(command_prefix=PREFIXES, intents=intents, case_insensitive=Tr
 os.makedirs("data", exist_ok=True)
 TASKS_FILE = "data/tasks.json"
 TEAMS_FILE = "data/teams.json"
+GUILDS_FILE = "data/guilds.json"
+SCHEDULE_FILE = "data/schedule.json"
+EVENTS_FILE = "data/events.jsonl"
+ROLLUPS_DIR = "data/rollups"
 
 def load_data(file):
     if not os.path.exists(file):
@@ -81,35 +95,494 @@ def create_team_embed(team_name, team_data):
     
     return embed
 
+# ———————————— TEAM INDEX ————————————
+# In-memory lookups kept in sync with every team/task mutation, so team commands
+# don't have to scan every team or task on disk.
+team_members = {}   # team name -> set of member ids
+user_teams = {}     # user id -> set of team names the user is a member of
+leader_teams = {}   # user id -> set of team names the user leads
+team_leaders = {}   # team name -> leader id
+team_tasks = {}     # team name -> {task id: summary of the task fields team views show}
+
+def build_team_index():
+    """Rebuild the team index from the data files"""
+    team_members.clear()
+    user_teams.clear()
+    leader_teams.clear()
+    team_leaders.clear()
+    team_tasks.clear()
+
+    for team_name, team_data in load_data(TEAMS_FILE).items():
+        team_members[team_name] = set()
+        team_tasks[team_name] = {}
+        for member_id in team_data.get("members", []):
+            index_add_member(team_name, member_id)
+        if "leader" in team_data:
+            index_set_leader(team_name, team_data["leader"])
+
+    for task in load_data(TASKS_FILE):
+        index_set_task(task)
+
+def index_add_member(team_name, user_id):
+    team_members.setdefault(team_name, set()).add(user_id)
+    user_teams.setdefault(user_id, set()).add(team_name)
+
+def index_remove_member(team_name, user_id):
+    team_members.get(team_name, set()).discard(user_id)
+    teams = user_teams.get(user_id)
+    if teams is not None:
+        teams.discard(team_name)
+        if not teams:
+            del user_teams[user_id]
+
+def index_set_leader(team_name, new_leader):
+    old_leader = team_leaders.pop(team_name, None)
+    if old_leader is not None:
+        teams = leader_teams.get(old_leader)
+        if teams is not None:
+            teams.discard(team_name)
+            if not teams:
+                del leader_teams[old_leader]
+    if new_leader is not None:
+        team_leaders[team_name] = new_leader
+        leader_teams.setdefault(new_leader, set()).add(team_name)
+
+def index_set_task(task, old_team=None):
+    """Record a task under its team, moving it out of `old_team` if it changed teams"""
+    if old_team and old_team != task.get("team"):
+        team_tasks.get(old_team, {}).pop(task["id"], None)
+    if task.get("team"):
+        team_tasks.setdefault(task["team"], {})[task["id"]] = {
+            key: task[key] for key in ("name", "assigned_to", "priority", "deadline", "done") if key in task
+        }
+
+def index_remove_task(task):
+    if task.get("team"):
+        team_tasks.get(task["team"], {}).pop(task["id"], None)
+
+def index_drop_team(team_name):
+    """Remove a team from the index, returning the summaries of its tasks"""
+    for member_id in list(team_members.pop(team_name, ())):
+        index_remove_member(team_name, member_id)
+    index_set_leader(team_name, None)
+    return team_tasks.pop(team_name, {})
+
+def is_team_member(team_name, user_id):
+    return user_id in team_members.get(team_name, ())
+
+build_team_index()
+
+# ———————————— ACTIVITY LOG ————————————
+# Every task/team mutation is appended to an event log and folded into per-day
+# rollup buckets, so charts read a handful of day buckets instead of rescanning
+# every task. Buckets live in memory and each day is stored in its own file, so
+# a mutation only rewrites the current day. Each bucket remembers how far into
+# the log it has been applied; on startup any events past that point (e.g. after
+# a crash between the two writes) are replayed.
+rollups = {}       # "YYYY-MM-DD" -> {"all": counts, "users": {id: counts}, "teams": {name: counts}, "log_offset": int}
+open_history = {}  # "all" / "user:<id>" / "team:<name>" -> ([days], [open tasks at the end of each day])
+
+def record_event(kind, **fields):
+    """Append an event to the log and add it to the daily rollups"""
+    event = {"ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "kind": kind, **fields}
+    offset = append_events([event])
+    day = apply_event(event)
+    rollups[day]["log_offset"] = offset
+    save_rollup_day(day)
+
+def append_events(events):
+    """Write events to the log, returning the log size afterwards"""
+    with open(EVENTS_FILE, "ab") as f:
+        for event in events:
+            f.write((json.dumps(event) + "\n").encode())
+        return f.tell()
+
+def save_rollup_day(day):
+    # Write then rename, so a crash never leaves a half-written bucket behind
+    path = os.path.join(ROLLUPS_DIR, f"{day}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(rollups[day], f)
+    os.replace(path + ".tmp", path)
+
+def bump(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+def move_open(day, scope_key, counts, amount):
+    """Record tasks entering (amount > 0) or leaving (amount < 0) a scope's open set"""
+    bump(counts, "opened" if amount > 0 else "closed", abs(amount))
+    days, values = open_history.setdefault(scope_key, ([], []))
+    total = (values[-1] if values else 0) + amount
+    counts["open"] = total  # Running total, so reports never sum earlier days
+    if days and days[-1] == day:
+        values[-1] = total
+    else:
+        days.append(day)
+        values.append(total)
+
+def open_count_at(day, scope_key):
+    """Open tasks in a scope at the end of `day` ("YYYY-MM-DD")"""
+    days, values = open_history.get(scope_key, ([], []))
+    i = bisect.bisect_right(days, day)
+    return values[i - 1] if i else 0
+
+def apply_event(event):
+    """Count an event in its day bucket, overall and per user/team, returning the day"""
+    day = event["ts"][:10]
+    bucket = rollups.setdefault(day, {"all": {}, "users": {}, "teams": {}})
+    kind = event["kind"]
+
+    scopes = [("all", bucket["all"])]
+    if event.get("user") is not None:
+        scopes.append((f"user:{event['user']}", bucket["users"].setdefault(str(event["user"]), {})))
+    if event.get("team"):
+        scopes.append((f"team:{event['team']}", bucket["teams"].setdefault(event["team"], {})))
+    for _, counts in scopes:
+        bump(counts, kind)
+
+    # Tasks entering/leaving each scope's open set, accumulated by burndown reports
+    if kind == "task_created":
+        for scope_key, counts in scopes:
+            move_open(day, scope_key, counts, 1)
+    elif kind == "task_completed" or (kind == "task_deleted" and not event.get("done")):
+        for scope_key, counts in scopes:
+            move_open(day, scope_key, counts, -1)
+    elif kind == "task_reassigned" and not event.get("done"):
+        move_open(day, f"user:{event['from_user']}", bucket["users"].setdefault(str(event["from_user"]), {}), -1)
+        move_open(day, f"user:{event['user']}", bucket["users"][str(event["user"])], 1)
+    elif kind == "task_updated" and not event.get("done") and event.get("from_team") != event.get("team"):
+        if event.get("from_team"):
+            move_open(day, f"team:{event['from_team']}", bucket["teams"].setdefault(event["from_team"], {}), -1)
+        if event.get("team"):
+            move_open(day, f"team:{event['team']}", bucket["teams"][event["team"]], 1)
+    elif kind == "team_deleted" and event.get("open_tasks"):
+        move_open(day, f"team:{event['team']}", bucket["teams"].setdefault(event["team"], {}), -event["open_tasks"])
+
+    return day
+
+def seed_events():
+    """Write creation/completion events for existing tasks into a new event log"""
+    events = []
+    for task in load_data(TASKS_FILE):
+        fields = {"task_id": task["id"], "user": task["assigned_to"], "team": task.get("team"), "seeded": True}
+        if "created_at" in task:
+            events.append({"ts": task["created_at"], "kind": "task_created", **fields})
+        if "completed_at" in task:
+            events.append({"ts": task["completed_at"], "kind": "task_completed", **fields})
+    append_events(sorted(events, key=lambda e: e["ts"]))
+
+def load_rollups():
+    """Load the day buckets and replay any logged events they don't include yet"""
+    rollups.clear()
+    os.makedirs(ROLLUPS_DIR, exist_ok=True)
+    if not os.path.exists(EVENTS_FILE):
+        seed_events()
+
+    try:
+        for name in sorted(os.listdir(ROLLUPS_DIR)):
+            if name.endswith(".json"):
+                with open(os.path.join(ROLLUPS_DIR, name)) as f:
+                    rollups[name[:-5]] = json.load(f)
+    except ValueError:
+        rollups.clear()  # Unreadable bucket: rebuild everything from the log
+    offset = max((bucket.get("log_offset", 0) for bucket in rollups.values()), default=0)
+
+    # Rebuild the open-count history from the running totals stored in the buckets
+    open_history.clear()
+    for day in sorted(rollups):
+        bucket = rollups[day]
+        scopes = [("all", bucket["all"])]
+        scopes += [(f"user:{user_id}", counts) for user_id, counts in bucket["users"].items()]
+        scopes += [(f"team:{team_name}", counts) for team_name, counts in bucket["teams"].items()]
+        for scope_key, counts in scopes:
+            if "open" in counts:
+                days, values = open_history.setdefault(scope_key, ([], []))
+                days.append(day)
+                values.append(counts["open"])
+
+    changed = set()
+    with open(EVENTS_FILE, "rb+") as f:
+        f.seek(offset)
+        while line := f.readline():
+            if not line.endswith(b"\n"):
+                f.truncate(offset)  # Drop an event cut short by a crash
+                break
+            day = apply_event(json.loads(line))
+            offset = f.tell()
+            rollups[day]["log_offset"] = offset
+            changed.add(day)
+
+    for day in changed:
+        save_rollup_day(day)
+
+def scope_counts(bucket, user=None, team=None):
+    """A day bucket's counters for one user, one team or overall"""
+    if user is not None:
+        return bucket["users"].get(str(user), {})
+    if team is not None:
+        return bucket["teams"].get(team, {})
+    return bucket["all"]
+
+def rollup_count(day, kind, user=None, team=None):
+    """Number of `kind` events on `day`, optionally for one user or team"""
+    bucket = rollups.get(day.strftime("%Y-%m-%d"))
+    if not bucket:
+        return 0
+    return scope_counts(bucket, user, team).get(kind, 0)
+
+load_rollups()
+
+# ———————————— REPORTS ————————————
+# Burndown/velocity series are built from the daily rollups and rendered in a
+# worker thread. Images are cached per report and re-rendered only when the
+# series they were drawn from has changed.
+REPORT_RANGES = {"week": 7, "month": 30, "quarter": 90, "year": 365}
+REPORT_CACHE_SIZE = 64
+report_cache = {}  # (report, scope, range) -> (series, png bytes)
+
+def burndown_series(days, team=None):
+    """Open tasks at the end of each day, plus tasks opened/closed that day"""
+    scope_key = f"team:{team}" if team is not None else "all"
+    open_counts, opened, closed = [], [], []
+    for day in days:
+        opened.append(rollup_count(day, "opened", team=team))
+        closed.append(rollup_count(day, "closed", team=team))
+        open_counts.append(open_count_at(day.strftime("%Y-%m-%d"), scope_key))
+    return open_counts, opened, closed
+
+def velocity_series(week_starts, user=None, team=None):
+    """Tasks completed in each 7-day window"""
+    return [sum(rollup_count(start + timedelta(days=i), "task_completed", user=user, team=team) for i in range(7))
+            for start in week_starts]
+
+def render_burndown(title, days, open_counts, opened, closed):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.bar(days, opened, color="#FF9800", alpha=0.5, label="Opened")
+    ax.bar(days, [-c for c in closed], color="#4CAF50", alpha=0.5, label="Closed")
+    ax.plot(days, open_counts, color="#2196F3", marker="o", label="Open tasks")
+    ax.axhline(0, color="black", linewidth=0.5)
+    ax.set_title(title)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Tasks")
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    return buf.getvalue()
+
+def render_velocity(title, week_starts, completed):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    labels = [start.strftime("%b %d") for start in week_starts]
+    ax.bar(labels, completed, color="#4CAF50")
+    average = sum(completed) / len(completed)
+    ax.axhline(average, color="#F44336", linestyle="--", label=f"Average: {average:.1f}/week")
+    ax.set_title(title)
+    ax.set_xlabel("Week starting")
+    ax.set_ylabel("Tasks Completed")
+    ax.grid(True, axis="y", alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    return buf.getvalue()
+
+async def cached_report(key, render, *series):
+    """Return the PNG for a report, re-rendering off the event loop only if its series changed"""
+    cached = report_cache.get(key)
+    if cached and cached[0] == series:
+        return cached[1]
+
+    png = await asyncio.to_thread(render, *series)
+    report_cache.pop(key, None)
+    if len(report_cache) >= REPORT_CACHE_SIZE:
+        report_cache.pop(next(iter(report_cache)))  # Evict the oldest entry
+    report_cache[key] = (series, png)
+    return png
+
 # ———————————— BOT EVENTS ————————————
 @bot.event
 async def on_ready():
     print(f"✅ Logged in as {bot.user}")
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name=f"your tasks | {PREFIXES[0]}help"))
 
-    if not alive_loop.is_running():
-        alive_loop.start()
-    if not daily_task_report.is_running():
-        daily_task_report.start()
+    if not scheduler_tick.is_running():
+        scheduler_tick.start()
+
+# ———————————— SCHEDULER ————————————
+# Jobs run on cron-style wall-clock schedules in each guild's timezone. The last
+# run of every job is persisted so restarts don't repeat work, a job never
+# overlaps itself, and a per-guild jitter spreads runs out instead of firing
+# them all at the same instant.
+scheduled_jobs = {}  # job name -> {"cron": parsed fields, "func": coroutine, "jitter": seconds}
+running_jobs = {}    # "job:guild_id" -> asyncio.Task of the run in progress
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = map(int, part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expr):
+    """
+    Parse a cron expression: minute hour day month weekday (0 = Sunday)
+    As in standard cron, when both day and weekday are restricted a time matching either fires.
+    """
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Invalid cron expression: {expr}")
+    bounds = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+    return [parse_cron_field(field, low, high) for field, (low, high) in zip(fields, bounds)]
+
+def next_cron_time(cron, after):
+    """Return the first wall-clock time matching `cron` strictly after `after`"""
+    minutes, hours, days, months, weekdays = cron
+    either_day = len(days) < 31 and len(weekdays) < 7  # Both restricted: either may match
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=366 * 8)  # Long enough to reach the next Feb 29
+
+    while t < limit:
+        day_match = t.day in days
+        weekday_match = (t.weekday() + 1) % 7 in weekdays
+        if t.month not in months:
+            t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+        elif not ((day_match or weekday_match) if either_day else (day_match and weekday_match)):
+            t = t.replace(hour=0, minute=0) + timedelta(days=1)
+        elif t.hour not in hours:
+            t = t.replace(minute=0) + timedelta(hours=1)
+        elif t.minute not in minutes:
+            t += timedelta(minutes=1)
+        else:
+            return t
+
+    raise ValueError("Cron expression never fires")
+
+def scheduled_job(cron, jitter=0):
+    """Register a coroutine `func(guild)` to run on a cron schedule"""
+    parsed = parse_cron(cron)
+    try:
+        next_cron_time(parsed, datetime.now())
+    except ValueError:
+        raise ValueError(f"Cron expression never fires: {cron}")
+
+    def decorator(func):
+        scheduled_jobs[func.__name__] = {"cron": parsed, "func": func, "jitter": jitter}
+        return func
+    return decorator
+
+def scheduled_guilds():
+    """Guilds scheduled jobs run for (task data is shared, so only the home guild)"""
+    guild = bot.get_guild(GUILD_ID)
+    return [guild] if guild else []
+
+def get_guild_timezone(guild_id):
+    settings = load_data(GUILDS_FILE).get(str(guild_id), {})
+    try:
+        return ZoneInfo(settings.get("timezone", DEFAULT_TIMEZONE))
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+def job_jitter(job_key, jitter):
+    """Stable per-guild offset in seconds, so runs are spread but predictable"""
+    return zlib.crc32(job_key.encode()) % jitter if jitter else 0
+
+@tasks.loop(seconds=30)
+async def scheduler_tick():
+    """Start every scheduled job that is due"""
+    try:
+        start_due_jobs()
+    except Exception as e:
+        # A bad schedule/settings file must not end the loop; retry on the next tick
+        print(f"⚠️ Scheduler tick failed: {e}")
+
+def start_due_jobs():
+    state = load_data(SCHEDULE_FILE)
+    now = datetime.now(timezone.utc)
+
+    for guild in scheduled_guilds():
+        tz = get_guild_timezone(guild.id)
+        for name, job in scheduled_jobs.items():
+            job_key = f"{name}:{guild.id}"
+            job_state = state.setdefault(job_key, {})
+
+            # First time we see this job: start counting from now rather than firing immediately
+            if "last_run" not in job_state:
+                job_state["last_run"] = now.isoformat()
+                continue
+
+            try:
+                last_run = datetime.fromisoformat(job_state["last_run"]).astimezone(tz)
+                due = next_cron_time(job["cron"], last_run) + timedelta(seconds=job_jitter(job_key, job["jitter"]))
+            except ValueError as e:
+                # Don't let one broken job stop the scheduler for every other job
+                print(f"⚠️ Job {job_key} could not be scheduled: {e}")
+                continue
+            if due > now:
+                continue
+
+            # The slot is consumed either way, so a long run skips rather than queues
+            job_state["last_run"] = now.isoformat()
+            if job_key in running_jobs:
+                job_state["skipped"] = job_state.get("skipped", 0) + 1
+                continue
+
+            running_jobs[job_key] = asyncio.create_task(run_job(job_key, job["func"], guild))
+
+    save_data(state, SCHEDULE_FILE)
+
+async def run_job(job_key, func, guild):
+    """Run a single job instance and record its runtime stats"""
+    started = time.perf_counter()
+    error = None
+    try:
+        await func(guild)
+    except Exception as e:
+        error = e
+    finally:
+        running_jobs.pop(job_key, None)
+    duration = time.perf_counter() - started
+
+    state = load_data(SCHEDULE_FILE)
+    stats = state.setdefault(job_key, {})
+    stats["runs"] = stats.get("runs", 0) + 1
+    stats["total_duration"] = stats.get("total_duration", 0) + duration
+    stats["last_duration"] = duration
+    stats["max_duration"] = max(stats.get("max_duration", 0), duration)
+    if error:
+        stats["failures"] = stats.get("failures", 0) + 1
+        stats["last_error"] = str(error)
+        print(f"⚠️ Job {job_key} failed: {error}")
+    save_data(state, SCHEDULE_FILE)
 
 # ———————————— BACKGROUND TASKS ————————————
-@tasks.loop(minutes=10)
-async def alive_loop():
+@scheduled_job("*/10 * * * *")
+async def alive_loop(guild):
     """Regular status update to show the bot is alive"""
-    guild = bot.get_guild(GUILD_ID)
-    if not guild: return
-    
     channel = discord.utils.get(guild.text_channels, name=STATUS_CHANNEL)
     if not channel:
         channel = await guild.create_text_channel(STATUS_CHANNEL)
     await channel.send("🤖 I'm alive and running 24/7! 🌟")
 
-@tasks.loop(hours=24)
-async def daily_task_report():
+@scheduled_job(DAILY_REPORT_CRON, jitter=DAILY_REPORT_JITTER)
+async def daily_task_report(guild):
     """Daily report of pending tasks"""
-    guild = bot.get_guild(GUILD_ID)
-    if not guild: return
-    
     tasks = load_data(TASKS_FILE)
     pending_tasks = [t for t in tasks if not t["done"]]
     
@@ -123,7 +596,8 @@ async def daily_task_report():
             tasks_by_user[user_id] = []
         tasks_by_user[user_id].append(task)
     
-    # Send DM reminders
+    # Send DM reminders, spread evenly over the spread window
+    delay = DAILY_REPORT_SPREAD / len(tasks_by_user)
     for user_id, user_tasks in tasks_by_user.items():
         embed = discord.Embed(
             title="📅 Daily Task Reminder",
@@ -146,7 +620,8 @@ async def daily_task_report():
             member = await guild.fetch_member(user_id)
             await member.send(embed=embed)
         except:
-            continue  # Skip if user can't be DM'd
+            pass  # Skip if user can't be DM'd
+        await asyncio.sleep(delay)
 
 # ———————————— TASK COMMANDS ————————————
 @bot.command(name="taskcreate", aliases=["createtask", "addtask", "newtask"])
@@ -211,6 +686,9 @@ async def task_create(ctx, *, args: str = None):
     tasks = load_data(TASKS_FILE)
     tasks.append(task)
     save_data(tasks, TASKS_FILE)
+    index_set_task(task)
+    record_event("task_created", task_id=task["id"], user=task["assigned_to"], team=task.get("team"), by=ctx.author.id)
+    ctx.created_task_id = task["id"]  # Traced, so replays can map later commands to the replayed task
     
     await ctx.send(f"📌 Task created:", embed=create_task_embed(task))
 
@@ -259,9 +737,13 @@ async def task_done(ctx, task_id: int):
     for task in tasks:
         if task["id"] == task_id:
             if task["assigned_to"] == ctx.author.id or ctx.author.guild_permissions.manage_messages:
+                was_done = task["done"]
                 task["done"] = True
                 task["completed_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 save_data(tasks, TASKS_FILE)
+                index_set_task(task)
+                if not was_done:
+                    record_event("task_completed", task_id=task_id, user=task["assigned_to"], team=task.get("team"), by=ctx.author.id)
                 
                 # Send notification to task creator if different from completer
                 if str(task.get("created_by", "")) != str(ctx.author):
@@ -289,8 +771,12 @@ async def task_assign(ctx, task_id: int, user: discord.Member):
                 str(task.get("created_by", "")) == str(ctx.author) or 
                 ctx.author.guild_permissions.manage_messages):
                 
+                previous = task["assigned_to"]
                 task["assigned_to"] = user.id
                 save_data(tasks, TASKS_FILE)
+                index_set_task(task)
+                record_event("task_reassigned", task_id=task_id, user=user.id, from_user=previous, team=task.get("team"),
+                             done=task["done"], by=ctx.author.id)
                 
                 # Notify the new assignee
                 try:
@@ -315,6 +801,8 @@ async def task_delete(ctx, task_id: int):
             if str(task.get("created_by", "")) == str(ctx.author) or ctx.author.guild_permissions.manage_messages:
                 tasks = [t for t in tasks if t["id"] != task_id]
                 save_data(tasks, TASKS_FILE)
+                index_remove_task(task)
+                record_event("task_deleted", task_id=task_id, user=task["assigned_to"], team=task.get("team"), done=task["done"], by=ctx.author.id)
                 return await ctx.send(f"🗑️ Task #{task_id} deleted.")
             else:
                 return await ctx.send("❌ You can only delete tasks you created.")
@@ -346,6 +834,7 @@ async def task_update(ctx, task_id: int, *, args: str):
                     updates[key.strip()] = value.strip().strip('"')
             
             # Apply updates
+            previous_team = task.get("team")
             if "name" in updates:
                 task["name"] = updates["name"]
             if "desc" in updates:
@@ -356,12 +845,14 @@ async def task_update(ctx, task_id: int, *, args: str):
             if "deadline" in updates:
                 task["deadline"] = updates["deadline"]
             if "team" in updates:
-                teams = load_data(TEAMS_FILE)
-                if updates["team"] in teams:
+                if updates["team"] in team_members:
                     task["team"] = updates["team"]
             
             task["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             save_data(tasks, TASKS_FILE)
+            index_set_task(task, previous_team)
+            record_event("task_updated", task_id=task_id, user=task["assigned_to"], team=task.get("team"),
+                         from_team=previous_team, done=task["done"], fields=sorted(updates), by=ctx.author.id)
             
             return await ctx.send(f"🔄 Task updated:", embed=create_task_embed(task))
     
@@ -419,25 +910,20 @@ async def task_chart(ctx, timeframe: str = "all"):
             colors=["#F44336", "#FFC107", "#8BC34A"])
     plt.title("Priority Distribution")
     
-    # Completion over time (if enough data)
-    if len(tasks) > 5 and any("completed_at" in t for t in tasks):
+    # Completion over time (if enough data), read from the daily rollups
+    first_day = cutoff.strftime("%Y-%m-%d") if timeframe != "all" else ""
+    completion_days = sorted(day for day, bucket in rollups.items()
+                             if day >= first_day and bucket["all"].get("task_completed"))
+    
+    if len(tasks) > 5 and completion_days:
         plt.subplot(2, 1, 2)
-        dates = []
-        completed = []
-        for t in tasks:
-            if "completed_at" in t:
-                date = datetime.strptime(t["completed_at"], "%Y-%m-%d %H:%M:%S").date()
-                dates.append(date)
-                completed.append(1)
-        
-        if dates and completed:
-            unique_dates = sorted(list(set(dates)))
-            daily_completed = [completed.count(d) for d in unique_dates]
-            plt.plot(unique_dates, daily_completed, marker="o")
-            plt.title("Completion Over Time")
-            plt.xlabel("Date")
-            plt.ylabel("Tasks Completed")
-            plt.grid(True)
+        dates = [datetime.strptime(day, "%Y-%m-%d").date() for day in completion_days]
+        daily_completed = [rollups[day]["all"]["task_completed"] for day in completion_days]
+        plt.plot(dates, daily_completed, marker="o")
+        plt.title("Completion Over Time")
+        plt.xlabel("Date")
+        plt.ylabel("Tasks Completed")
+        plt.grid(True)
     
     plt.tight_layout()
     
@@ -448,6 +934,52 @@ async def task_chart(ctx, timeframe: str = "all"):
     await ctx.send(file=discord.File(buf, "task_report.png"))
     plt.close()
 
+@bot.command(name="taskburndown", aliases=["burndown"])
+async def task_burndown(ctx, team_name: Optional[str] = None, timeframe: Optional[str] = None):
+    """
+    Show open tasks over time, overall or for one team
+    Usage: !taskburndown [team] [week/month/quarter/year]
+    """
+    if timeframe is None and team_name in REPORT_RANGES:
+        if team_name in team_members:
+            return await ctx.send(f"❌ '{team_name}' is both a team and a timeframe — give both, e.g. `!taskburndown {team_name} month`")
+        team_name, timeframe = None, team_name
+    timeframe = timeframe or "month"
+    if timeframe not in REPORT_RANGES:
+        return await ctx.send("❌ Invalid timeframe. Use week/month/quarter/year")
+    if team_name is not None and team_name not in team_members:
+        return await ctx.send("❌ Team not found.")
+
+    today = datetime.now().date()
+    days = [today - timedelta(days=i) for i in range(REPORT_RANGES[timeframe] - 1, -1, -1)]
+    open_counts, opened, closed = burndown_series(days, team=team_name)
+
+    title = f"Burndown – {team_name or 'All Tasks'} ({timeframe})"
+    png = await cached_report(("burndown", team_name, timeframe), render_burndown, title, days, open_counts, opened, closed)
+    await ctx.send(file=discord.File(io.BytesIO(png), "burndown.png"))
+
+@bot.command(name="taskvelocity", aliases=["velocity"])
+async def task_velocity(ctx, target: Optional[Union[discord.Member, str]] = None):
+    """
+    Show tasks completed per week over the last 8 weeks
+    Usage: !taskvelocity [@user/team]
+    """
+    target = target or ctx.author
+    if isinstance(target, str):
+        if target not in team_members:
+            return await ctx.send("❌ Team not found.")
+        user_id, team_name, label = None, target, target
+    else:
+        user_id, team_name, label = target.id, None, target.display_name
+
+    today = datetime.now().date()
+    week_starts = [today - timedelta(days=7 * i + 6) for i in range(7, -1, -1)]
+    completed = velocity_series(week_starts, user=user_id, team=team_name)
+
+    title = f"Velocity – {label}"
+    png = await cached_report(("velocity", user_id or team_name), render_velocity, title, week_starts, completed)
+    await ctx.send(file=discord.File(io.BytesIO(png), "velocity.png"))
+
 # ———————————— TEAM COMMANDS ————————————
 @bot.command(name="teamcreate", aliases=["createteam", "addteam"])
 async def team_create(ctx, team_name: str, *, description: str = None):
@@ -468,6 +1000,9 @@ async def team_create(ctx, team_name: str, *, description: str = None):
         teams[team_name]["description"] = description
     
     save_data(teams, TEAMS_FILE)
+    index_add_member(team_name, ctx.author.id)
+    index_set_leader(team_name, ctx.author.id)
+    record_event("team_created", team=team_name, user=ctx.author.id, by=ctx.author.id)
     await ctx.send(f"👥 Team '{team_name}' created!", embed=create_team_embed(team_name, teams[team_name]))
 
 @bot.command(name="teamadd", aliases=["addmember", "teaminvite"])
@@ -482,11 +1017,13 @@ async def team_add(ctx, team_name: str, member: discord.Member):
     if teams[team_name]["leader"] != ctx.author.id and not ctx.author.guild_permissions.manage_messages:
         return await ctx.send("❌ Only the team leader can add members.")
     
-    if member.id in teams[team_name]["members"]:
+    if is_team_member(team_name, member.id):
         return await ctx.send("❌ Member is already in the team.")
     
     teams[team_name]["members"].append(member.id)
     save_data(teams, TEAMS_FILE)
+    index_add_member(team_name, member.id)
+    record_event("team_member_added", team=team_name, user=member.id, by=ctx.author.id)
     
     # Notify the new member
     try:
@@ -509,7 +1046,7 @@ async def team_remove(ctx, team_name: str, member: discord.Member):
     if teams[team_name]["leader"] != ctx.author.id and not ctx.author.guild_permissions.manage_messages:
         return await ctx.send("❌ Only the team leader can remove members.")
     
-    if member.id not in teams[team_name]["members"]:
+    if not is_team_member(team_name, member.id):
         return await ctx.send("❌ Member is not in this team.")
     
     # Prevent removing the leader
@@ -518,6 +1055,8 @@ async def team_remove(ctx, team_name: str, member: discord.Member):
     
     teams[team_name]["members"].remove(member.id)
     save_data(teams, TEAMS_FILE)
+    index_remove_member(team_name, member.id)
+    record_event("team_member_removed", team=team_name, user=member.id, by=ctx.author.id)
     
     # Notify the removed member
     try:
@@ -540,11 +1079,14 @@ async def team_leader(ctx, team_name: str, new_leader: discord.Member):
     if teams[team_name]["leader"] != ctx.author.id and not ctx.author.guild_permissions.manage_messages:
         return await ctx.send("❌ Only the current team leader can transfer leadership.")
     
-    if new_leader.id not in teams[team_name]["members"]:
+    if not is_team_member(team_name, new_leader.id):
         return await ctx.send("❌ New leader must be a team member.")
     
+    previous = teams[team_name]["leader"]
+    index_set_leader(team_name, new_leader.id)
     teams[team_name]["leader"] = new_leader.id
     save_data(teams, TEAMS_FILE)
+    record_event("team_leader_changed", team=team_name, user=new_leader.id, from_user=previous, by=ctx.author.id)
     
     # Notify the new leader
     try:
@@ -588,15 +1130,26 @@ async def team_delete(ctx, team_name: str):
     if msg.content.lower() != "confirm":
         return await ctx.send("❌ Team deletion cancelled.")
     
+    # Other team commands may have run while we waited, so start from fresh data
+    teams = load_data(TEAMS_FILE)
+    if team_name not in teams:
+        return await ctx.send("❌ Team not found.")
+    if teams[team_name]["leader"] != ctx.author.id and not ctx.author.guild_permissions.manage_messages:
+        return await ctx.send("❌ Only the team leader can delete the team.")
+    
     # Remove team and reassign any team tasks
-    tasks = load_data(TASKS_FILE)
-    for task in tasks:
-        if task.get("team") == team_name:
-            task["team"] = None
+    dropped_tasks = index_drop_team(team_name)
+    open_tasks = sum(1 for summary in dropped_tasks.values() if not summary["done"])
+    if dropped_tasks:
+        tasks = load_data(TASKS_FILE)
+        for task in tasks:
+            if task["id"] in dropped_tasks:
+                task["team"] = None
+        save_data(tasks, TASKS_FILE)
     
     del teams[team_name]
     save_data(teams, TEAMS_FILE)
-    save_data(tasks, TASKS_FILE)
+    record_event("team_deleted", team=team_name, task_ids=sorted(dropped_tasks), open_tasks=open_tasks, by=ctx.author.id)
     
     await ctx.send(f"🗑️ Team '{team_name}' has been deleted.")
 
@@ -635,6 +1188,37 @@ async def team_list(ctx):
     
     await ctx.send(embed=embed)
 
+@bot.command(name="teamtasks", aliases=["teamworkload", "teamtasklist"])
+async def team_task_list(ctx, team_name: str):
+    """Show the tasks assigned to a team"""
+    if team_name not in team_members:
+        return await ctx.send("❌ Team not found.")
+
+    summaries = team_tasks.get(team_name)
+    if not summaries:
+        return await ctx.send(f"📭 Team '{team_name}' has no tasks.")
+
+    pending_tasks = [{"id": task_id, **summary} for task_id, summary in sorted(summaries.items()) if not summary["done"]]
+
+    embed = discord.Embed(
+        title=f"📋 Team Tasks: {team_name}",
+        description=f"⏳ Pending: {len(pending_tasks)}\n✅ Completed: {len(summaries) - len(pending_tasks)}",
+        color=0x7289da
+    )
+
+    for task in pending_tasks[:10]:  # Show up to 10 pending tasks
+        deadline = f" (⏰ {task['deadline']})" if "deadline" in task else ""
+        embed.add_field(
+            name=f"#{task['id']} - {task['name']}{deadline}",
+            value=f"👤 <@{task['assigned_to']}> • 🔝 {task.get('priority', 'medium').capitalize()}",
+            inline=False
+        )
+
+    if len(pending_tasks) > 10:
+        embed.set_footer(text=f"+ {len(pending_tasks) - 10} more pending tasks...")
+
+    await ctx.send(embed=embed)
+
 # ———————————— USER COMMANDS ————————————
 @bot.command(name="userprofile", aliases=["profile", "myprofile"])
 async def user_profile(ctx, user: Optional[discord.Member] = None):
@@ -649,6 +1233,10 @@ async def user_profile(ctx, user: Optional[discord.Member] = None):
     # Calculate completion rate (avoid division by zero)
     completion_rate = (completed / len(user_tasks)) * 100 if user_tasks else 0
     
+    # Throughput over the last week from the daily rollups
+    today = datetime.now().date()
+    completed_week = sum(rollup_count(today - timedelta(days=i), "task_completed", user=user.id) for i in range(7))
+    
     embed = discord.Embed(
         title=f"👤 {user.display_name}'s Profile",
         color=user.color
@@ -656,24 +1244,17 @@ async def user_profile(ctx, user: Optional[discord.Member] = None):
     embed.set_thumbnail(url=user.avatar.url if user.avatar else None)
     
     embed.add_field(name="📊 Task Stats", 
-                   value=f"✅ Completed: {completed}\n⏳ Pending: {pending}\n📈 Completion: {completion_rate:.1f}%", 
+                   value=f"✅ Completed: {completed}\n⏳ Pending: {pending}\n📈 Completion: {completion_rate:.1f}%\n🚀 Last 7 days: {completed_week}", 
                    inline=True)
     
     # Show teams the user is in
-    teams = load_data(TEAMS_FILE)
-    user_teams = []
-    leader_teams = []
+    member_of = sorted(user_teams.get(user.id, ()))
+    leader_of = sorted(leader_teams.get(user.id, ()))
     
-    for team_name, team_data in teams.items():
-        if user.id in team_data.get("members", []):
-            user_teams.append(team_name)
-        if team_data.get("leader") == user.id:
-            leader_teams.append(team_name)
-    
-    if user_teams:
-        embed.add_field(name="👥 Member of", value="\n".join(user_teams), inline=True)
-    if leader_teams:
-        embed.add_field(name="👑 Leader of", value="\n".join(leader_teams), inline=True)
+    if member_of:
+        embed.add_field(name="👥 Member of", value="\n".join(member_of), inline=True)
+    if leader_of:
+        embed.add_field(name="👑 Leader of", value="\n".join(leader_of), inline=True)
     
     # Show recent tasks if any
     if user_tasks:
@@ -687,6 +1268,57 @@ async def user_profile(ctx, user: Optional[discord.Member] = None):
     
     await ctx.send(embed=embed)
 
+# ———————————— SETTINGS COMMANDS ————————————
+@bot.command(name="settimezone", aliases=["timezone", "settz"])
+async def set_timezone(ctx, tz_name: str):
+    """
+    Set the timezone scheduled reports use (home server only)
+    Usage: !settimezone Europe/Berlin
+    """
+    if ctx.guild is None or ctx.guild.id != GUILD_ID:
+        return await ctx.send("❌ Scheduled reports only run for the bot's home server, so the timezone can only be set there.")
+    if not ctx.author.guild_permissions.manage_guild:
+        return await ctx.send("❌ You need the Manage Server permission to change the timezone.")
+
+    try:
+        ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return await ctx.send("❌ Unknown timezone. Use a name like `Europe/Berlin` or `America/New_York`.")
+
+    guilds = load_data(GUILDS_FILE)
+    guilds.setdefault(str(ctx.guild.id), {})["timezone"] = tz_name
+    save_data(guilds, GUILDS_FILE)
+
+    await ctx.send(f"🕒 Timezone set to {tz_name}.")
+
+@bot.command(name="jobstats", aliases=["schedulerstats", "jobs"])
+async def job_stats(ctx):
+    """Show runtime statistics for scheduled jobs"""
+    state = load_data(SCHEDULE_FILE)
+
+    if not state:
+        return await ctx.send("📭 No scheduled jobs have run yet.")
+
+    embed = discord.Embed(
+        title="⏱️ Scheduled Jobs",
+        description=f"Timezone: {get_guild_timezone(GUILD_ID)}",
+        color=0x00ffcc
+    )
+
+    for job_key, stats in state.items():
+        runs = stats.get("runs", 0)
+        average = stats.get("total_duration", 0) / runs if runs else 0
+        status = "🔄 Running" if job_key in running_jobs else "💤 Idle"
+        embed.add_field(
+            name=job_key.split(":")[0],
+            value=(f"{status}\n▶️ Runs: {runs} • ❌ Failures: {stats.get('failures', 0)} • ⏭️ Skipped: {stats.get('skipped', 0)}\n"
+                   f"⏱️ Avg: {average:.2f}s • Max: {stats.get('max_duration', 0):.2f}s\n"
+                   f"🕒 Last run: {stats.get('last_run', 'never')[:19]}"),
+            inline=False
+        )
+
+    await ctx.send(embed=embed)
+
 # ———————————— HELP COMMAND ————————————
 @bot.command(name="taskhelp", aliases=["commands", "bothelp"])
 async def help_command(ctx, command: str = None):
@@ -724,7 +1356,9 @@ async def help_command(ctx, command: str = None):
                 f"`{ctx.prefix}taskassign <id> @user` - Reassign task",
                 f"`{ctx.prefix}taskupdate <id> --param value` - Update task details",
                 f"`{ctx.prefix}taskdelete <id>` - Delete task",
-                f"`{ctx.prefix}taskchart [timeframe]` - Generate task statistics"
+                f"`{ctx.prefix}taskchart [timeframe]` - Generate task statistics",
+                f"`{ctx.prefix}taskburndown [team] [timeframe]` - Open tasks over time",
+                f"`{ctx.prefix}taskvelocity [@user/team]` - Tasks completed per week"
             ]),
             ("👥 Team Management", [
                 f"`{ctx.prefix}teamcreate <name> [desc]` - Create new team",
@@ -733,11 +1367,16 @@ async def help_command(ctx, command: str = None):
                 f"`{ctx.prefix}teamleader <team> @user` - Transfer leadership",
                 f"`{ctx.prefix}teaminfo <team>` - View team info",
                 f"`{ctx.prefix}teamlist` - List all teams",
+                f"`{ctx.prefix}teamtasks <team>` - View team workload",
                 f"`{ctx.prefix}teamdelete <team>` - Delete team"
             ]),
             ("👤 User Commands", [
                 f"`{ctx.prefix}profile [@user]` - View user profile",
                 f"`{ctx.prefix}taskhelp [command]` - Show this help"
+            ]),
+            ("⚙️ Settings", [
+                f"`{ctx.prefix}settimezone <tz>` - Set timezone for scheduled reports (home server)",
+                f"`{ctx.prefix}jobstats` - Show scheduled job statistics"
             ])
         ]
         
@@ -750,6 +1389,76 @@ async def help_command(ctx, command: str = None):
         
         await ctx.send(embed=embed)
 
+# ———————————— COMMAND TRACING ————————————
+# When TRACE_FILE is set, every command invocation is logged with its timing and
+# arguments so real traffic can be replayed with replay_trace.py. Only structural
+# values are kept (converted ints, known flag names, --priority/--deadline values
+# and filter/timeframe keywords); every other word is replaced by an HMAC token,
+# so the same team name always maps to the same token without storing content.
+TRACE_KEYWORDS = {"all", "done", "pending", "week", "month", "quarter", "year"}
+TRACE_FLAGS = {"--desc", "--name", "--priority", "--deadline", "--team"}
+TRACE_PRIORITIES = {"high", "medium", "low"}
+
+def scrub_token(token):
+    return "w" + hmac.new(TRACE_SECRET, token.encode(), hashlib.sha256).hexdigest()[:12]
+
+def scrub_text(text):
+    """Hash every word except known flags and the enumerated values that follow them"""
+    flag = None
+
+    def scrub(match):
+        nonlocal flag
+        word, previous = match.group(), flag
+        flag = word if word in TRACE_FLAGS else None
+        if flag:
+            return word
+        if previous == "--priority" and word.lower() in TRACE_PRIORITIES:
+            return word
+        if previous == "--deadline" and re.fullmatch(r"\d{4}-\d{2}-\d{2}", word):
+            return word
+        return scrub_token(word)
+
+    return re.sub(r'[^\s"]+', scrub, text)
+
+def scrub_arg(value):
+    """Reduce a command argument to a replayable value without message content"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (discord.User, discord.Member)):
+        return {"user": value.id}
+    if isinstance(value, str):
+        if value.lower() in TRACE_KEYWORDS:
+            return value
+        if value.lower().startswith("team:"):
+            return value[:5] + scrub_token(value[5:])
+        return scrub_text(value)
+    return type(value).__name__
+
+@bot.before_invoke
+async def trace_start(ctx):
+    ctx.trace_started = (time.time(), time.perf_counter())
+
+@bot.after_invoke
+async def trace_finish(ctx):
+    if not TRACE_FILE or not hasattr(ctx, "trace_started"):
+        return
+
+    started_at, started = ctx.trace_started
+    entry = {
+        "ts": started_at,
+        "command": ctx.command.qualified_name,
+        "args": [scrub_arg(arg) for arg in ctx.args[1:]],
+        "kwargs": {name: scrub_arg(value) for name, value in ctx.kwargs.items()},
+        "author": ctx.author.id,
+        "guild": ctx.guild.id if ctx.guild else None,
+        "duration": time.perf_counter() - started,
+        "failed": ctx.command_failed
+    }
+    if hasattr(ctx, "created_task_id"):
+        entry["created_task_id"] = ctx.created_task_id
+    with open(TRACE_FILE, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
 # ———————————— ERROR HANDLING ————————————
 @bot.event
 async def on_command_error(ctx, error):
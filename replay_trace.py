@@ -0,0 +1,175 @@
+"""
+Replay a command trace recorded with TRACE_FILE against the bot's command handlers.
+
+Commands run against a fake Discord transport in a scratch data directory, so the
+real bot token, guild and data are never touched. Reports per-command latency
+percentiles and event loop lag.
+
+Task ids recorded by !taskcreate are mapped to the ids the replay hands out, so
+later commands on those tasks hit the replayed task. Commands on tasks created
+before the trace started have nothing to act on and just report "not found".
+
+Usage: python replay_trace.py trace.jsonl [--speed 10] [--data-dir NEW_DIR]
+"""
+import argparse, asyncio, json, os, sys, tempfile, time
+from types import SimpleNamespace
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ———————————— FAKE TRANSPORT ————————————
+class FakeUser:
+    """Stands in for a discord.Member; DMs are accepted and dropped"""
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.display_name = f"user{user_id}"
+        self.color = 0
+        self.avatar = None
+        # Traces don't record permissions, so replayed users may do everything
+        self.guild_permissions = SimpleNamespace(manage_messages=True, manage_guild=True)
+
+    def __str__(self):
+        return self.display_name
+
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.text_channels = []
+
+    async def fetch_member(self, user_id):
+        return FakeUser(user_id)
+
+class FakeContext:
+    def __init__(self, author, guild, stats):
+        self.author = author
+        self.guild = guild
+        self.channel = None
+        self.prefix = "!"
+        self.stats = stats
+
+    async def send(self, *args, **kwargs):
+        self.stats["messages"] += 1
+        await asyncio.sleep(0)
+
+def load_arg(value):
+    if isinstance(value, dict) and "user" in value:
+        return FakeUser(value["user"])
+    return value
+
+TASK_ID_COMMANDS = {"taskdone", "taskassign", "taskupdate", "taskdelete"}  # First argument is a task id
+
+# ———————————— REPLAY ————————————
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def monitor_loop_lag(lags, stop, interval=0.01):
+    """Measure how late the event loop wakes up a sleeping task"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+async def replay(bot_module, entries, speed):
+    bot = bot_module.bot
+    latencies, errors, stats = {}, {}, {"messages": 0, "skipped": 0}
+    guilds = {}
+    created = {}  # recorded task id -> context of the replayed !taskcreate
+
+    async def confirm(event, check=None, timeout=None):
+        return SimpleNamespace(content="confirm")
+    bot.wait_for = confirm  # teamdelete asks for confirmation
+
+    async def run_entry(entry):
+        command = bot.get_command(entry["command"])
+        if not command:
+            stats["skipped"] += 1
+            return
+        guild = guilds.setdefault(entry.get("guild"), FakeGuild(entry.get("guild")))
+        ctx = FakeContext(FakeUser(entry["author"]), guild, stats)
+        args = [load_arg(arg) for arg in entry.get("args", [])]
+        kwargs = {name: load_arg(value) for name, value in entry.get("kwargs", {}).items()}
+        if "created_task_id" in entry:
+            created[entry["created_task_id"]] = ctx
+        if command.name in TASK_ID_COMMANDS and args and args[0] in created:
+            # Creates start in trace order and get their id before their first await,
+            # so the replayed id is known by the time a later command starts
+            args[0] = getattr(created[args[0]], "created_task_id", args[0])
+
+        started = time.perf_counter()
+        try:
+            await command.callback(ctx, *args, **kwargs)
+        except Exception:
+            errors[command.name] = errors.get(command.name, 0) + 1
+        latencies.setdefault(command.name, []).append(time.perf_counter() - started)
+
+    lags, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lags, stop))
+
+    running = []
+    first_ts = entries[0]["ts"]
+    started = time.perf_counter()
+    for entry in entries:
+        delay = (entry["ts"] - first_ts) / speed - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        running.append(asyncio.create_task(run_entry(entry)))
+
+    await asyncio.gather(*running)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return latencies, errors, stats, lags, elapsed
+
+def print_report(latencies, errors, stats, lags, elapsed):
+    total = sum(len(values) for values in latencies.values())
+    print(f"Replayed {total} commands in {elapsed:.2f}s ({stats['skipped']} skipped, {stats['messages']} messages sent)")
+    print()
+    print(f"{'command':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, values in sorted(latencies.items()):
+        print(f"{name:<16}{len(values):>7}{errors.get(name, 0):>8}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{max(values) * 1000:>10.1f}")
+    if lags:
+        print()
+        print(f"Event loop lag: p50 {percentile(lags, 50) * 1000:.1f} ms, "
+              f"p99 {percentile(lags, 99) * 1000:.1f} ms, max {max(lags) * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded command trace against the bot")
+    parser.add_argument("trace", help="trace file written by the bot with TRACE_FILE set")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (default: 1x)")
+    parser.add_argument("--data-dir", help="new or empty directory to run in (default: a new temporary directory)")
+    options = parser.parse_args()
+
+    if options.speed <= 0:
+        parser.error("--speed must be positive")
+    if options.data_dir and os.path.isdir(options.data_dir) and os.listdir(options.data_dir):
+        parser.error("--data-dir must be new or empty; the replay modifies the data it finds there")
+
+    with open(options.trace) as f:
+        entries = sorted((json.loads(line) for line in f if line.strip()), key=lambda e: e["ts"])
+    if not entries:
+        sys.exit("Trace is empty.")
+
+    # The bot keeps its data relative to the working directory, so switch to the
+    # scratch directory before importing it
+    data_dir = options.data_dir or tempfile.mkdtemp(prefix="replay-")
+    os.makedirs(data_dir, exist_ok=True)
+    os.chdir(data_dir)
+    os.environ.setdefault("DISCORD_TOKEN", "replay")
+    os.environ.setdefault("GUILD_ID", str(entries[0].get("guild") or 0))
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.environ["TRACE_FILE"] = ""  # Don't record the replay itself, even if .env enables tracing
+    sys.path.insert(0, BOT_DIR)
+    import advanced_task_bot
+
+    print(f"Replaying {len(entries)} commands at {options.speed:g}x in {data_dir}")
+    print_report(*asyncio.run(replay(advanced_task_bot, entries, options.speed)))
+
+if __name__ == "__main__":
+    main()